@@ -33,9 +33,37 @@ from sqlalchemy.orm import relationship, Session
 BARS_SERIES = 0
 BARS_PANDAS = 1
 BARS_NUMPY = 2
+BARS_STRUCTURED = 3
+# record layout of BARS_STRUCTURED, same column order as BARS_NUMPY
+BARS_DTYPE = np.dtype([('close', np.float64),
+                       ('open', np.float64),
+                       ('volume', np.float64),
+                       ('high', np.float64),
+                       ('low', np.float64),
+                       ('date', 'datetime64[s]')])
 BASE = declarative_base()
 
 
+def to_structured_bars(bars):
+    """
+    Converts bars of output type BARS_NUMPY to a structured array of type BARS_DTYPE
+    :param bars: two dimensional object array with bars
+    :return: structured array, missing prices are nan
+    """
+    if bars is None or bars.dtype.names is not None:
+        return bars
+    if bars.size == 0:
+        return np.empty(0, dtype=BARS_DTYPE)
+    structured = np.empty(bars.shape[0], dtype=BARS_DTYPE)
+    for idx, name in enumerate(BARS_DTYPE.names):
+        column = bars[:, idx]
+        if name == 'date':
+            structured[name] = column.astype(BARS_DTYPE[name])
+        else:
+            structured[name] = np.where(np.equal(column, None), np.nan, column)
+    return structured
+
+
 class Exchange(BASE):
     """
     Sqlalchemy object for exchange representation
@@ -122,14 +150,17 @@ class SeriesItem:
                                                                      'High', 'Low', 'Date'])
             data_frame = data_frame.set_index(pd.DatetimeIndex(data_frame['Date'].dt.date))
             return data_frame
-        elif output_type == BARS_NUMPY:
-            return np.asarray([[i.priceclose,
+        elif output_type == BARS_NUMPY or output_type == BARS_STRUCTURED:
+            bars = np.asarray([[i.priceclose,
                                 i.priceopen,
                                 i.volume,
                                 i.pricehigh,
                                 i.pricelow,
                                 i.date
                                ] for i in series])
+            if output_type == BARS_STRUCTURED:
+                return to_structured_bars(bars)
+            return bars
         return series
 
 
@@ -249,6 +280,34 @@ class Stock(BASE, SeriesItem):
                                         return -1
         return -1
 
+    def get_annual_data_attr(self, key, attr, years):
+        """
+        Get annual company data by key and attr for several years in one pass.
+        The value at position idx equals get_data_attr(key, attr, True, idx * 4).
+        :param key:
+        :param attr:
+        :param years: number of years
+        :return: numpy array with values, -1 if not available
+        """
+        values = np.full(years, -1, dtype=np.float64)
+        year = 0
+        for idx, data in enumerate(self.get_data(key)):
+            if year >= years:
+                break
+            if 'annual' in data and data['annual'] and 'struts' in data:
+                for strut in data['struts']:
+                    if 'attr' in strut and 'value' in strut and strut['attr'] == attr:
+                        try:
+                            value = float(strut['value'])
+                        except ValueError:
+                            value = -1
+                        # the first match serves every year with a quarter diff up to idx
+                        while year < years and year * 4 <= idx:
+                            values[year] = value
+                            year += 1
+                        break
+        return values
+
 
 class Series(BASE):
     """
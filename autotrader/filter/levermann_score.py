@@ -16,13 +16,81 @@
  limitations under the License.
 """
 import logging
+from functools import lru_cache
 from datetime import date, datetime
+from numba import jit, prange
 import numpy as np
 from dateutil.relativedelta import relativedelta
 from autotrader.filter.base_filter import BaseFilter
-from autotrader.datasource.database.stock_schema import BARS_NUMPY
+from autotrader.datasource.database.stock_schema import BARS_STRUCTURED, to_structured_bars
 from autotrader.filter.stock_is_hot import StockIsHot as Sih
 
+PERFORMANCE_LIMIT = 0.05
+PRICE_EARNINGS_LIMIT = 12.0
+# criterion values for criteria scored before the thresholds are applied,
+# they pass, fail or are neutral for every threshold
+CRITERION_PASSED = np.inf
+CRITERION_FAILED = -np.inf
+CRITERION_NEUTRAL = np.nan
+# lower and upper threshold of each criterion, higher criterion values are better,
+# a criterion above the upper threshold counts +1, below the lower threshold -1
+CRITERIA_THRESHOLDS = np.array([
+    # 1. RoE > 20 % +1, < 10 % -1
+    [0.1, 0.2],
+    # 2. Ebit margin > 12 % +1, < 6 % -1
+    [0.06, 0.12],
+    # 3. equity ratio > 25 % +1, < 15 % -1
+    [0.15, 0.25],
+    # 4. PER < 12 +1, > 12 -1, the ratio is negated,
+    # missing ratios are CRITERION_FAILED for 4. and CRITERION_NEUTRAL for 5.
+    [-PRICE_EARNINGS_LIMIT, -PRICE_EARNINGS_LIMIT],
+    # 5. PER with average eps of 5 years, same as 4.
+    [-PRICE_EARNINGS_LIMIT, -PRICE_EARNINGS_LIMIT],
+    # 6. analysts rating >= 2.5 +1, <= 1.5 -1, nextafter makes the limits inclusive
+    [np.nextafter(1.5, np.inf), np.nextafter(2.5, -np.inf)],
+    # 7. impact of quarterly figures > 1 % +1, < -1 % -1
+    [-1.0, 1.0],
+    # 8. rating difference > 10 % +1, < 10 % -1
+    [10.0, 10.0],
+    # 9. performance 6 months > 5 % +1, < -5 % -1
+    [-PERFORMANCE_LIMIT, PERFORMANCE_LIMIT],
+    # 10. performance 12 months > 5 % +1, < -5 % -1
+    [-PERFORMANCE_LIMIT, PERFORMANCE_LIMIT],
+    # 11. raising momentum, already scored as +1, 0 or -1
+    [-0.5, 0.5],
+    # 12. compare with index, already scored as +1, 0 or -1
+    [-0.5, 0.5],
+    # 13. eps difference > 5 % +1, < -5 % -1
+    [-5.0, 5.0],
+])
+CRITERIA_LOWER = np.ascontiguousarray(CRITERIA_THRESHOLDS[:, 0])
+CRITERIA_UPPER = np.ascontiguousarray(CRITERIA_THRESHOLDS[:, 1])
+# positions of the pillars in the criteria array
+QUALITY_CRITERIA = slice(0, 3)
+RATING_CRITERIA = slice(3, 5)
+MOOD_CRITERIA = slice(5, 7)
+MOMENTUM_CRITERIA = slice(7, 11)
+TECHNIQUE_CRITERIA = slice(11, 12)
+GROWING_CRITERIA = slice(12, 13)
+
+
+@jit(nopython=True, cache=True)
+def calculate_score(criteria, lower, upper):
+    """
+    numba optimized score of criteria values, shared by single and batch analysis
+    :param criteria: criteria values
+    :param lower: a criterion below its lower threshold counts -1
+    :param upper: a criterion above its upper threshold counts +1
+    :return: the score
+    """
+    score = 0
+    for idx in range(criteria.shape[0]):
+        if criteria[idx] > upper[idx]:
+            score += 1
+        elif criteria[idx] < lower[idx]:
+            score -= 1
+    return score
+
 
 class LevermannScore(BaseFilter):
     """
@@ -30,44 +98,87 @@ class LevermannScore(BaseFilter):
     """
 
     NAME = "LevermannScore"
+    INDEX_BARS_CACHE_SIZE = 32
+    # index bars and dates shared by all stocks of an index during a screening run,
+    # key is (index id, start, end)
+    _index_bars_cache = {}
 
     def __init__(self, arguments: dict, logger: logging.Logger):
         super(LevermannScore, self).__init__(arguments, logger)
+        self.dates = None
+        self.set_bars(self.bars)
         self.buy = arguments['threshold_buy']
         self.sell = arguments['threshold_sell']
         self.lookback = arguments['lookback']
         self.intervals = arguments['intervals']
+        # stop the analysis as soon as the status can not change anymore, the score is then
+        # only known within calc_bounds and get_calculation returns None, so keep it off
+        # wherever the calculation is stored, e.g. by BuildFilters
+        self.short_circuit = arguments.get('short_circuit', False)
+        # lowest and highest possible score of the last analysis
+        self.calc_bounds = (self.calc, self.calc)
         self.index_bars = None
-        if self.bars is not None:
-            self.index_bars = self.stock.indices[0].get_bars(
-                start=self.bars[:, 5][0],
-                end=self.bars[:, 5][-1],
-                output_type=BARS_NUMPY
-            ) if self.stock is not None else None
+        self.index_dates = None
+        if self.bars is not None and self.stock is not None:
+            self.__set_index_bars()
+
+    def set_bars(self, bars):
+        super(LevermannScore, self).set_bars(to_structured_bars(bars))
+        # contiguous date column for binary searches by date
+        self.dates = np.ascontiguousarray(self.bars['date']) if self.bars is not None else None
 
     def set_stock(self, stock):
         self.stock = stock
-        self.index_bars = self.stock.indices[0].get_bars(
-            start=self.bars[:, 5][0],
-            end=self.bars[:, 5][-1],
-            output_type=BARS_NUMPY) if stock is not None else None
+        if stock is not None:
+            self.__set_index_bars()
+        else:
+            self.index_bars = None
+            self.index_dates = None
+
+    def __set_index_bars(self):
+        index = self.stock.indices[0]
+        start = self.dates[0].item()
+        end = self.dates[-1].item()
+        key = (index.id, start, end)
+        if key not in self._index_bars_cache:
+            if len(self._index_bars_cache) >= self.INDEX_BARS_CACHE_SIZE:
+                self._index_bars_cache.clear()
+            index_bars = index.get_bars(start=start, end=end, output_type=BARS_STRUCTURED)
+            index_dates = np.ascontiguousarray(index_bars['date'])
+            # shared between all instances
+            index_bars.flags.writeable = False
+            index_dates.flags.writeable = False
+            self._index_bars_cache[key] = (index_bars, index_dates)
+        self.index_bars, self.index_dates = self._index_bars_cache[key]
+
+    @classmethod
+    def clear_index_bars_cache(cls):
+        """
+        Drops the cached index bars, call it before each screening run
+        :return: nothing
+        """
+        cls._index_bars_cache.clear()
 
     @staticmethod
     def calculate_trendsrating(datas):
         """
-        Calculates the analysts rating ala Levermann
+        Calculates the analysts rating ala Levermann. Results are cached per distribution,
+        building the cache key walks the data as well, so the cache only pays off for
+        distributions repeated across stocks.
         :param datas: analysts data
         :return: the rating score
         """
-        nominator = 0
-        denominator = 0
-        for data in datas:
-            nominator += data['Recommendation']*data['NumberOfAnalysts']
-            denominator += data['NumberOfAnalysts']
-        try:
-            return nominator / denominator
-        except ZeroDivisionError:
+        return LevermannScore.__calculate_trendsrating(
+            tuple((data['Recommendation'], data['NumberOfAnalysts']) for data in datas))
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def __calculate_trendsrating(distribution):
+        ratings = np.array(distribution, dtype=np.float64).reshape(-1, 2)
+        denominator = ratings[:, 1].sum()
+        if denominator == 0:
             return 0
+        return float(np.dot(ratings[:, 0], ratings[:, 1]) / denominator)
 
     def __calculate_shareholders_equity(self):
         total_assets = self.stock.get_data_attr("balance", "totalAssets")
@@ -99,25 +210,17 @@ class LevermannScore(BaseFilter):
             shareholders_equity_ratio = self.__calculate_shareholders_equity() / total_assets
         return shareholders_equity_ratio
 
-    def __calculate_eps_avg(self, years=5):
-        eps_counter = 0
-        eps_n = 0
-        for idx in range(0, years):
-            eps_annual = self.stock.get_data_attr("income", "dilutedEpsExtraOrd", annual=True,
-                                                  quarter_diff=idx * 4)
-            if eps_annual != -1:
-                eps_n += eps_annual
-                eps_counter += 1
-        if eps_counter == 0:
-            return -1
-        eps_n /= eps_counter
-        return eps_n
+    @staticmethod
+    def __calculate_eps_stats(eps_annuals):
+        # average and last available annual eps, -1 and 0 if there is none
+        eps_annuals = eps_annuals[eps_annuals != -1]
+        if eps_annuals.size == 0:
+            return -1, 0
+        return float(eps_annuals.mean()), float(eps_annuals[-1])
 
-    def __calculate_price_earnings_ratios(self):
-        eps_estimate = self.stock.get_data_attr("recommendation", "eps")
-        close_prices = self.bars[:, 0]
+    @staticmethod
+    def __calculate_price_earnings_ratios(close_prices, eps_estimate, eps_avg):
         last_close = close_prices[-1]
-        eps_avg = self.__calculate_eps_avg()
         if eps_estimate > 0 and eps_avg > 0:
             per = last_close / eps_estimate
             per_5 = last_close / eps_avg
@@ -131,191 +234,201 @@ class LevermannScore(BaseFilter):
             last_quarterly = last_quarterly[0]['reportDate']
         else:
             return -1
-        # get index by report date
-        last_quarterly = last_quarterly.split('T00')[0]
-        # report date provided by webull looks not accurate
-        last_quarterly = datetime.strptime(last_quarterly, '%Y-%m-%d')
-        idx_index_last_quarterly = np.where(self.index_bars[:, 5] <
-                                            np.datetime64(last_quarterly))[0][-1]
-        idx_stock_last_quarterly = np.where(self.bars[:, 5] < np.datetime64(last_quarterly))[0][-1]
-        vals_stock_last_quarterly = self.bars[[idx_stock_last_quarterly,
-                                               idx_stock_last_quarterly - 1]]
-        vals_index_last_quarterly = self.index_bars[[idx_index_last_quarterly,
-                                                     idx_index_last_quarterly - 1]]
-        perf_quarterly_index_prc = 100 * (vals_index_last_quarterly[1][0] -
-                                          vals_index_last_quarterly[0][0]) /\
-            vals_index_last_quarterly[1][0]
-        perf_quarterly_stock_prc = 100 * (vals_stock_last_quarterly[1][0] -
-                                          vals_stock_last_quarterly[0][0]) / \
-            vals_stock_last_quarterly[1][0]
+        # get index by report date, report date provided by webull looks not accurate
+        last_quarterly = np.datetime64(last_quarterly[:10], 'D')
+        # last bar before the report date, dates are sorted ascending
+        idx_index_last_quarterly = np.searchsorted(self.index_dates, last_quarterly) - 1
+        idx_stock_last_quarterly = np.searchsorted(self.dates, last_quarterly) - 1
+        if idx_index_last_quarterly < 1 or idx_stock_last_quarterly < 1:
+            return -1
+        stock_close = self.bars['close'][idx_stock_last_quarterly]
+        stock_close_prev = self.bars['close'][idx_stock_last_quarterly - 1]
+        index_close = self.index_bars['close'][idx_index_last_quarterly]
+        index_close_prev = self.index_bars['close'][idx_index_last_quarterly - 1]
+        perf_quarterly_index_prc = 100.0 * (index_close_prev - index_close) / index_close_prev
+        perf_quarterly_stock_prc = 100.0 * (stock_close_prev - stock_close) / stock_close_prev
         perf_quarterly = perf_quarterly_stock_prc - perf_quarterly_index_prc
         return perf_quarterly
 
-    def __calculate_rating_differences_in_percent(self):
-        rating = self.calculate_trendsrating(
-            self.stock.get_data("recommendation")['trends'][0]['distributionList']
-        )
-        rating_4w = self.calculate_trendsrating(
-            self.stock.get_data("recommendation")['trends'][2]['distributionList'])
+    @staticmethod
+    def __calculate_rating_differences_in_percent(rating, rating_4w):
+        # no analysts rate the stock at the moment
+        if rating == 0:
+            return 0
         rating_dif_prc = 100 * (rating_4w - rating) / rating
         return rating_dif_prc
 
-    def __calculate_performance(self):
-        close_prices = self.bars[:, 0]
-        close_6m = close_prices[int(close_prices.size / 2)]
+    @staticmethod
+    def __calculate_performance(close_prices):
         last_close = close_prices[-1]
-        first_close = self.bars[:, 0][0]
-        last_close_6m_diff = last_close / close_6m - 1
-        last_close_12m_diff = last_close / first_close - 1
+        last_close_6m_diff = last_close / close_prices[close_prices.size >> 1] - 1.0
+        last_close_12m_diff = last_close / close_prices[0] - 1.0
         return [last_close_6m_diff, last_close_12m_diff]
 
-    def __compare_index_with_stock_performance(self):
-        close_prices = self.bars[:, 0]
+    def __compare_index_with_stock_performance(self, close_prices):
         stock_perf = Sih.get_performance(close_prices, 30)[::-1]
-        index_perf = Sih.get_performance(self.index_bars[:, 0], 30)[::-1]
-        perf_measure = 0
-        if not hasattr(stock_perf, 'size') or not hasattr(index_perf, 'size') or \
-                stock_perf.size == 0 or index_perf.size == 0:
-            return perf_measure
-
-        for idx, perf in enumerate(np.nditer(index_perf)):
-            if perf > stock_perf[idx]:
-                perf_measure += 1
-            else:
-                perf_measure -= 1
-        return perf_measure
-
-    def __calculate_eps_difference(self):
-        eps_estimate = self.stock.get_data_attr("recommendation", "eps")
-        eps_last = 0
-        for idx in range(0, 5):
-            eps_annual = self.stock.get_data_attr("income", "dilutedEpsExtraOrd", annual=True,
-                                                  quarter_diff=idx * 4)
-            if eps_annual != -1:
-                eps_last = eps_annual
+        index_perf = Sih.get_performance(self.index_bars['close'], 30)[::-1]
+        if stock_perf.size == 0 or index_perf.size == 0:
+            return 0
+        # +1 for each interval the index beats the stock, -1 otherwise
+        size = min(stock_perf.size, index_perf.size)
+        index_wins = index_perf[:size] > stock_perf[:size]
+        return int(2 * index_wins.sum() - size)
+
+    @staticmethod
+    def __calculate_eps_difference(eps_estimate, eps_last):
         try:
             eps_last_diff_prc = 100 * (eps_estimate - eps_last) / eps_estimate
             return eps_last_diff_prc
         except ZeroDivisionError:
             return 0
 
-    def __calculate_quality(self):
-        levermann = 0
-        roe = self.__calculate_roe()
-        ebit_margin = self.__calculate_ebit_margin()
-        shareholders_equity_ratio = self.__calculate_shareholders_equity_ratio()
-        # 1. RoE
-        if roe > 0.2:
-            levermann += 1
-        elif roe < 0.1:
-            levermann -= 1
-        # 2. Ebit
-        if ebit_margin > 0.12:
-            levermann += 1
-        elif ebit_margin < 0.06:
-            levermann -= 1
-        # 3. equity ratio
-        if shareholders_equity_ratio > 0.25:
-            levermann += 1
-        elif shareholders_equity_ratio < 0.15:
-            levermann -= 1
-        return levermann
-
-    def __calculate_rating(self):
-        levermann = 0
-        price_earnings_ratios = self.__calculate_price_earnings_ratios()
+    @staticmethod
+    @jit(nopython=True, parallel=True)
+    def __calculate_scores(criteria, lower, upper):
+        """
+        numba optimized scores of several stocks, one row of criteria values per stock
+        :param criteria: two dimensional array with criteria values
+        :param lower: a criterion below its lower threshold counts -1
+        :param upper: a criterion above its upper threshold counts +1
+        :return: the scores
+        """
+        scores = np.zeros(criteria.shape[0], dtype=np.int64)
+        for row in prange(criteria.shape[0]):
+            scores[row] = calculate_score(criteria[row], lower, upper)
+        return scores
+
+    def __get_quality_criteria(self):
+        # 1. RoE, 2. Ebit and 3. equity ratio
+        return [self.__calculate_roe(),
+                self.__calculate_ebit_margin(),
+                self.__calculate_shareholders_equity_ratio()]
+
+    def __get_rating_criteria(self, close_prices, eps_estimate, eps_avg):
+        price_earnings_ratios = self.__calculate_price_earnings_ratios(close_prices, eps_estimate,
+                                                                       eps_avg)
         if price_earnings_ratios is None:
-            return -1
+            # missing ratios count -1 in total
+            return [CRITERION_FAILED, CRITERION_NEUTRAL]
         # 4. Price-Earnings-Ratio and 5 Price-Earnings-Ratio 5 years ago
-        for ratio in price_earnings_ratios:
-            if ratio > 0 or ratio < 12:
-                levermann += 1
-            elif ratio > 12 or ratio < 0:
-                levermann -= 1
         # todo add 5. eps
-        return levermann
+        return [-ratio for ratio in price_earnings_ratios]
 
-    def __calculate_mood(self):
-        levermann = 0
-        rating = self.calculate_trendsrating(
-            self.stock.get_data("recommendation")['trends'][0]['distributionList']
-        )
-        impact_quartly = self.__calculate_impact_of_quartly_figures()
+    def __get_mood_criteria(self, rating):
         # 6. Analysis  >= 2.5 +1 <=1.5 -1
-        if rating >= 2.5:
-            levermann += 1
-        elif rating <= 1.5:
-            levermann -= 1
-
         # 7. impact of quarterly figures > 1 % +1 < -1 % = Kursreaktion - DAX Reaktion
-        if impact_quartly > 1.0:
-            levermann += 1
-        elif impact_quartly < -1.0:
-            levermann -= 1
-        return levermann
-
-    def __calculate_momentum(self):
-        levermann = 0
-        rating_dif_prc = self.__calculate_rating_differences_in_percent()
-        performance_list_stock = self.__calculate_performance()
+        return [rating, self.__calculate_impact_of_quartly_figures()]
+
+    def __get_momentum_criteria(self, close_prices, rating, rating_4w):
+        rating_dif_prc = self.__calculate_rating_differences_in_percent(rating, rating_4w)
+        performance_6m, performance_12m = self.__calculate_performance(close_prices)
+        # 11. raising momentum
+        raising = int(performance_6m > PERFORMANCE_LIMIT > performance_12m) - \
+            int(performance_6m < -PERFORMANCE_LIMIT < performance_12m)
         # 8. EPS -  not possible with our data therefore we take the overall rating
-        if rating_dif_prc > 10.0:
-            levermann += 1
-        elif rating_dif_prc < 10.0:
-            levermann -= 1
         # 9. performance 6 months and 10. 12 months
-        for per_it in performance_list_stock:
-            if per_it > 0.05:
-                levermann += 1
-            elif per_it < -0.05:
-                levermann -= 1
-        # 11. raising momentum
-        if performance_list_stock[0] > 0.05 and \
-                (0.05 > performance_list_stock[1] > -0.05 or performance_list_stock[1] < -0.05):
-            levermann += 1
-        elif performance_list_stock[0] < -0.05 and \
-                (0.05 > performance_list_stock[1] > -0.05 or performance_list_stock[1] > 0.05):
-            levermann -= 1
-        return levermann
-
-    def __calculate_technique(self):
-        levermann = 0
-        perf_measure = self.__compare_index_with_stock_performance()
+        return [rating_dif_prc, performance_6m, performance_12m, raising]
+
+    def __get_technique_criteria(self, close_prices):
+        perf_measure = self.__compare_index_with_stock_performance(close_prices)
         # 12. 3 month interval compare with index
-        if perf_measure == 3:
-            levermann += 1
-        elif perf_measure == -3:
-            levermann -= 1
-        return levermann
-
-    def __calculate_growing(self):
-        levermann = 0
-        eps_last_diff_prc = self.__calculate_eps_difference()
+        return [int(perf_measure == 3) - int(perf_measure == -3)]
+
+    def __get_growing_criteria(self, eps_estimate, eps_last):
         # 13. compare guessed eps of this year withe next year
-        if eps_last_diff_prc > 5.0:
-            levermann += 1
-        elif eps_last_diff_prc < -5.0:
-            levermann -= 1
-        return levermann
+        return [self.__calculate_eps_difference(eps_estimate, eps_last)]
+
+    def __get_criteria(self, short_circuit=False):
+        # returns the criteria and the number of criteria not evaluated yet
+        # fetch shared inputs only once per analysis
+        close_prices = self.bars['close']
+        trends = self.stock.get_data("recommendation")['trends']
+        rating = self.calculate_trendsrating(trends[0]['distributionList'])
+        rating_4w = self.calculate_trendsrating(trends[2]['distributionList'])
+        eps_estimate = self.stock.get_data_attr("recommendation", "eps")
+        eps_annuals = self.stock.get_annual_data_attr("income", "dilutedEpsExtraOrd", 5)
+        eps_avg, eps_last = self.__calculate_eps_stats(eps_annuals)
+        # pillars ordered by costs, the index comparison is the most expensive one
+        pillars = (
+            (QUALITY_CRITERIA, self.__get_quality_criteria, ()),
+            (RATING_CRITERIA, self.__get_rating_criteria, (close_prices, eps_estimate, eps_avg)),
+            (GROWING_CRITERIA, self.__get_growing_criteria, (eps_estimate, eps_last)),
+            (MOOD_CRITERIA, self.__get_mood_criteria, (rating,)),
+            (MOMENTUM_CRITERIA, self.__get_momentum_criteria, (close_prices, rating, rating_4w)),
+            (TECHNIQUE_CRITERIA, self.__get_technique_criteria, (close_prices,))
+        )
+        # criteria not evaluated yet are neutral
+        criteria = np.full(CRITERIA_THRESHOLDS.shape[0], CRITERION_NEUTRAL)
+        remaining = criteria.shape[0]
+        for pillar, get_criteria, pillar_arguments in pillars:
+            criteria[pillar] = get_criteria(*pillar_arguments)
+            remaining -= pillar.stop - pillar.start
+            if short_circuit and self.__is_determined(criteria, remaining):
+                break
+        return criteria, remaining
+
+    def __is_determined(self, criteria, remaining):
+        # each open criterion can change the score by one
+        score = calculate_score(criteria, CRITERIA_LOWER, CRITERIA_UPPER)
+        # the buy threshold is reached even if all open criteria fail
+        is_buy = score - remaining >= self.buy
+        # the sell threshold is kept even if all open criteria pass
+        is_sell = score + remaining <= self.sell and score + remaining < self.buy
+        return is_buy or is_sell
 
     def analyse(self):
         try:
-            levermann = self.__calculate_quality() \
-                        + self.__calculate_rating() \
-                        + self.__calculate_mood() \
-                        + self.__calculate_momentum() \
-                        + self.__calculate_technique() \
-                        + self.__calculate_growing()
-            self.calc = levermann
+            criteria, remaining = self.__get_criteria(self.short_circuit)
+            score = int(calculate_score(criteria, CRITERIA_LOWER, CRITERIA_UPPER))
+            # each criterion not evaluated after stopping early can change the score by one
+            self.calc_bounds = (score - remaining, score + remaining)
+            self.calc = score if remaining == 0 else None
         except (KeyError, IndexError, TypeError):
             self.logger.exception("Error during calculation.")
-        if self.calc >= self.buy:
+        if self.calc_bounds[0] >= self.buy:
             return BaseFilter.BUY
-        elif self.calc <= self.sell:
+        elif self.calc_bounds[1] <= self.sell:
             return BaseFilter.SELL
 
         return BaseFilter.HOLD
 
+    def analyse_batch(self, stocks, start=None, end=None):
+        """
+        Analyses several stocks at once, the scores are calculated in parallel.
+        All criteria are evaluated regardless of short_circuit, so the scores are complete.
+        Bars and stock of the filter are restored afterwards.
+        Stocks whose criteria can not be calculated are marked as failed and hold.
+        :param stocks: sqlalchemy stock objects
+        :param start: start date of bars, default is the look back date
+        :param end: end date of bars, default is now
+        :return: numpy arrays with the score, the status and the failed flag of each stock
+        """
+        start = self.look_back_date() if start is None else start
+        end = datetime.now() if end is None else end
+        self.clear_index_bars_cache()
+        state = (self.bars, self.dates, self.stock, self.index_bars, self.index_dates)
+        criteria = np.full((len(stocks), CRITERIA_THRESHOLDS.shape[0]), CRITERION_NEUTRAL)
+        failed = np.zeros(len(stocks), dtype=np.bool_)
+        try:
+            for idx, stock in enumerate(stocks):
+                try:
+                    self.set_bars(stock.get_bars(start=start, end=end,
+                                                 output_type=BARS_STRUCTURED))
+                    self.set_stock(stock)
+                    criteria[idx], _ = self.__get_criteria()
+                except (KeyError, IndexError, TypeError):
+                    self.logger.exception("Error during calculation of %s.", stock.symbol)
+                    criteria[idx] = CRITERION_NEUTRAL
+                    failed[idx] = True
+        finally:
+            self.bars, self.dates, self.stock, self.index_bars, self.index_dates = state
+        scores = self.__calculate_scores(criteria, CRITERIA_LOWER, CRITERIA_UPPER)
+        status = np.full(scores.shape, BaseFilter.HOLD)
+        status[scores <= self.sell] = BaseFilter.SELL
+        status[scores >= self.buy] = BaseFilter.BUY
+        status[failed] = BaseFilter.HOLD
+        return scores, status, failed
+
     def get_calculation(self):
         return self.calc
 
@@ -44,7 +44,7 @@ class PriceTargetScore(BaseFilter):
             low = float(prices['low'])
             high = float(prices['high'])
             mean = float(prices['mean'])
-            current = self.bars[:, 0][-1]
+            current = self.bars[-1, 0]
             diff_low = current - low
             diff_high = current - high
             diff_mean = current - mean
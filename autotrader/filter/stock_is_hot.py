@@ -17,6 +17,7 @@
 """
 import logging
 from datetime import date, datetime
+from numba import jit
 import numpy as np
 from dateutil.relativedelta import relativedelta
 from autotrader.filter.base_filter import BaseFilter
@@ -75,17 +76,42 @@ class StockIsHot(BaseFilter):
         Splits values by interval and calculates for each split the performance value
         :param array: close prices of stock
         :param interval: interval in days
-        :return: list with performance values
+        :return: numpy array with performance values, empty if there are too few prices
         """
-        array = array[array != np.array(None)]
-        steps = int(array.shape[0]/interval)
-        delta_list = np.zeros(steps)
-        for idx in range(1, steps+1):
-            y_values = array[interval*idx-interval:interval*idx]
-            x_values = np.arange(y_values.shape[0])
-            poly = np.polyfit(x_values, y_values, 1)
-            delta_list[idx-1] = poly[0]
-        return np.diff(delta_list)
+        if array is None or interval < 1:
+            return np.empty(0, dtype=np.float64)
+        array = np.ascontiguousarray(array[array != np.array(None)], dtype=np.float64)
+        array = array[~np.isnan(array)]
+        return np.diff(StockIsHot.__calculate_slopes(array, interval))
+
+    @staticmethod
+    @jit(nopython=True, cache=True)
+    def __calculate_slopes(array, interval):
+        """
+        numba optimized least squares slope of each full interval
+        :param array: close prices of stock
+        :param interval: interval in days
+        :return: slope of each interval
+        """
+        steps = array.shape[0] // interval
+        slopes = np.zeros(steps)
+        x_mean = (interval - 1) / 2.0
+        x_var = 0.0
+        for x_value in range(interval):
+            x_var += (x_value - x_mean) ** 2
+        if x_var == 0:
+            return slopes
+        for step in range(steps):
+            offset = step * interval
+            y_mean = 0.0
+            for x_value in range(interval):
+                y_mean += array[offset + x_value]
+            y_mean /= interval
+            covariance = 0.0
+            for x_value in range(interval):
+                covariance += (x_value - x_mean) * (array[offset + x_value] - y_mean)
+            slopes[step] = covariance / x_var
+        return slopes
 
     def look_back_date(self):
         return datetime.today() + relativedelta(months=-self.lookback)
@@ -36,8 +36,8 @@ class StockIsHotSecure(StockIsHot):
         super(StockIsHotSecure, self).__init__(arguments, logger)
 
     def analyse(self):
-        first_value = self.bars[:, 1][0]
-        last_value = self.bars[:, 1][-1]
+        first_value = self.bars[0, 1]
+        last_value = self.bars[-1, 1]
         if first_value == 0:
             return BaseFilter.HOLD
         secure_value = last_value/first_value
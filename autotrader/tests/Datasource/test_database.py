@@ -20,7 +20,8 @@ import logging
 from autotrader.base.trader_base import TraderBase
 from autotrader.broker.degiro.degiro_client import DegiroClient
 from autotrader.datasource.database.stock_database import StockDataBase
-from autotrader.datasource.database.stock_schema import BARS_NUMPY, BARS_PANDAS, Stock
+from autotrader.datasource.database.stock_schema import BARS_NUMPY, BARS_PANDAS, BARS_STRUCTURED, \
+    Stock
 from autotrader.tool.database.create_and_fill_database import CreateAndFillDataBase
 from autotrader.tool.database.update_database_stocks import UpdateDataBaseStocks
 
@@ -59,6 +60,9 @@ class TestDataBase(unittest.TestCase):
         assert bars
         bars = adidas.get_bars(output_type=BARS_NUMPY)
         assert bars.shape[1] > 0
+        structured_bars = adidas.get_bars(output_type=BARS_STRUCTURED)
+        assert structured_bars.shape[0] == bars.shape[0]
+        assert structured_bars['close'][-1] == bars[-1, 0]
         bars = adidas.get_bars(output_type=BARS_PANDAS)
         assert bars.size > 0
         DB.session.close()
@@ -116,6 +120,10 @@ class TestDataBase(unittest.TestCase):
         assert bars
         adidas = DB.session.query(Stock).filter(Stock.name == "Adidas AG").first()
         assert len(adidas.jsondata) == 6
+        eps_annuals = adidas.get_annual_data_attr("income", "dilutedEpsExtraOrd", 5)
+        for idx, eps_annual in enumerate(eps_annuals):
+            assert eps_annual == adidas.get_data_attr("income", "dilutedEpsExtraOrd",
+                                                      annual=True, quarter_diff=idx * 4)
         DB.session.close()
 
 
@@ -18,16 +18,110 @@
 import datetime
 import unittest
 import logging
+import numpy as np
+import numpy.testing as npt
 from autotrader.base.trader_base import TraderBase
-from autotrader.filter.levermann_score import LevermannScore as Ls
+from autotrader.filter.base_filter import BaseFilter
+from autotrader.filter.levermann_score import LevermannScore as Ls, RATING_CRITERIA, \
+    CRITERION_FAILED, CRITERION_NEUTRAL
 from autotrader.datasource.database.stock_database import StockDataBase as Db
-from autotrader.datasource.database.stock_schema import Stock, BARS_NUMPY
+from autotrader.datasource.database.stock_schema import Stock, BARS_NUMPY, to_structured_bars
 
 
 TEST_LOGGER = logging.getLogger()
 TEST_LOGGER.setLevel(logging.WARNING)
 
 
+def get_fake_bars(closes, start=datetime.datetime(2016, 6, 1, 0, 0)):
+    """
+    Creates bars with the layout of BARS_NUMPY, one bar per day
+    :param closes: close prices
+    :param start: date of first bar
+    :return: bars
+    """
+    return np.asarray([[close, close, 0, close, close, start + datetime.timedelta(days=idx)]
+                       for idx, close in enumerate(closes)])
+
+
+class FakeIndex:
+    """
+    Index without database
+    """
+
+    def __init__(self, bars):
+        self.id = -1
+        self.bars = bars
+
+    def get_bars(self, start, end, output_type):
+        """
+        Returns the index bars
+        """
+        return to_structured_bars(self.bars)
+
+
+class FakeStock:
+    """
+    Stock without database
+    """
+
+    def __init__(self, bars, data, attributes=None):
+        self.symbol = "FAKE"
+        self.bars = bars
+        self.indices = [FakeIndex(bars)]
+        self.data = data
+        self.attributes = attributes if attributes is not None else {}
+
+    def get_bars(self, start, end, output_type):
+        """
+        Returns the stock bars
+        """
+        return to_structured_bars(self.bars)
+
+    def get_data(self, key):
+        """
+        Returns company data by key
+        """
+        return self.data.get(key)
+
+    def get_data_attr(self, key, attr, annual=False, quarter_diff=0):
+        """
+        Returns company data by key and attr
+        """
+        return self.attributes[(key, attr)]
+
+    def get_annual_data_attr(self, key, attr, years):
+        """
+        Returns annual company data by key and attr
+        """
+        return np.array(self.attributes[(key, attr)][:years], dtype=np.float64)
+
+
+def get_fake_stock(bars, eps_estimate):
+    """
+    Creates a stock with complete company data
+    :param bars: bars of stock and index
+    :param eps_estimate: estimated eps, 0 if there is no estimate
+    :return: stock
+    """
+    distribution = [{'Recommendation': 2, 'NumberOfAnalysts': 3}]
+    data = {
+        'recommendation': {'trends': [{'distributionList': distribution}, {},
+                                      {'distributionList': distribution}]},
+        'income': [{'reportDate': "2016-09-01T00:00:00.000+0000"}]
+    }
+    attributes = {
+        ('balance', 'totalAssets'): 1000.0,
+        ('balance', 'totalCurrentLiabili'): 500.0,
+        ('balance', 'accumulatedDepreciation'): 10.0,
+        ('income', 'netIncome'): 75.0,
+        ('income', 'netBeforeTaxes'): 100.0,
+        ('income', 'totalRevenue'): 1000.0,
+        ('income', 'dilutedEpsExtraOrd'): [10.0] * 5,
+        ('recommendation', 'eps'): eps_estimate
+    }
+    return FakeStock(bars, data, attributes)
+
+
 class TestLevermann(unittest.TestCase):
     """
     Tests the levermann implementation
@@ -36,12 +130,12 @@ class TestLevermann(unittest.TestCase):
     @staticmethod
     def test_levermann():
         """
-        Tests two stocks with freezed data set
+        Tests stocks with freezed data set
         """
         config = TraderBase.get_config()
         db_tool = Db(config['sql'], TEST_LOGGER)
         db_tool.connect()
-        symbols = [["LHA", 1, 0], ["MRK", -1, 0]]
+        symbols = [["LHA", 1, 0], ["MRK", -1, 0], ["BMW", 1, 0]]
         for symbol in symbols:
             stock = db_tool.session.query(Stock).filter(symbol[0] == Stock.symbol).first()
             arguments = {
@@ -64,6 +158,175 @@ class TestLevermann(unittest.TestCase):
             assert symbol[2] == status, " Status: %s != %s" % (symbol[2], status)
         db_tool.session.close()
 
+    @staticmethod
+    def test_impact_report_before_bars():
+        """
+        Tests the impact of quarterly figures for report dates without a previous bar
+        """
+        bars = get_fake_bars([10.0, 11.0, 12.0, 13.0])
+        for report_date, impact in [("2016-01-01T00:00:00.000+0000", -1),
+                                    ("2016-06-01T00:00:00.000+0000", -1),
+                                    ("2016-06-02T00:00:00.000+0000", -1),
+                                    ("2016-06-04T00:00:00.000+0000", 0)]:
+            stock = FakeStock(bars, {'income': [{'reportDate': report_date}]})
+            arguments = {
+                'stock': stock,
+                'name': Ls.NAME,
+                'bars': bars,
+                'threshold_buy': 7,
+                'threshold_sell': 2,
+                'intervals': None,
+                'lookback': 12
+            }
+            Ls.clear_index_bars_cache()
+            my_filter = Ls(arguments, TEST_LOGGER)
+            npt.assert_almost_equal(
+                my_filter._LevermannScore__calculate_impact_of_quartly_figures(), impact)
+        Ls.clear_index_bars_cache()
+
+    @staticmethod
+    def test_levermann_missing_price_earnings():
+        """
+        Tests that missing price earnings ratios count -1 and are not open criteria
+        """
+        bars = get_fake_bars(np.linspace(50.0, 100.0, 400))
+        calcs = []
+        for eps_estimate in [10.0, 0.0]:
+            arguments = {
+                'stock': get_fake_stock(bars, eps_estimate),
+                'name': Ls.NAME,
+                'bars': bars,
+                'threshold_buy': 7,
+                'threshold_sell': 2,
+                'intervals': None,
+                'lookback': 12
+            }
+            Ls.clear_index_bars_cache()
+            my_filter = Ls(arguments, TEST_LOGGER)
+            my_filter.analyse()
+            calcs.append(my_filter.get_calculation())
+            criteria, remaining = my_filter._LevermannScore__get_criteria()
+            assert remaining == 0
+            if eps_estimate == 0.0:
+                npt.assert_equal(criteria[RATING_CRITERIA],
+                                 [CRITERION_FAILED, CRITERION_NEUTRAL])
+        Ls.clear_index_bars_cache()
+        # both ratios below 12 count +2, missing ratios -1
+        assert calcs[0] - calcs[1] == 3
+
+    @staticmethod
+    def test_trendsrating():
+        """
+        Tests the analysts rating of a rated and an unrated distribution
+        """
+        distribution = [{'Recommendation': 1, 'NumberOfAnalysts': 3},
+                        {'Recommendation': 2, 'NumberOfAnalysts': 0},
+                        {'Recommendation': 4, 'NumberOfAnalysts': 1}]
+        unrated = [{'Recommendation': 1, 'NumberOfAnalysts': 0},
+                   {'Recommendation': 2, 'NumberOfAnalysts': 0}]
+        npt.assert_almost_equal(Ls.calculate_trendsrating(distribution), 1.75)
+        assert Ls.calculate_trendsrating(unrated) == 0
+        assert Ls.calculate_trendsrating([]) == 0
+        # a repeated distribution is served by the cache
+        cached = Ls._LevermannScore__calculate_trendsrating
+        hits = cached.cache_info().hits
+        npt.assert_almost_equal(Ls.calculate_trendsrating(list(distribution)), 1.75)
+        assert cached.cache_info().hits == hits + 1
+
+    @staticmethod
+    def test_levermann_short_circuit():
+        """
+        Tests that stopping the analysis early keeps the status of the full analysis
+        """
+        config = TraderBase.get_config()
+        db_tool = Db(config['sql'], TEST_LOGGER)
+        db_tool.connect()
+        # symbol, full calculation, all stocks stop early
+        symbols = [["LHA", 1], ["MRK", -1], ["BMW", 1]]
+        for symbol in symbols:
+            stock = db_tool.session.query(Stock).filter(symbol[0] == Stock.symbol).first()
+            arguments = {
+                'stock': stock,
+                'name': Ls.NAME,
+                'bars': stock.get_bars(
+                    start=datetime.datetime(2016, 6, 1, 0, 0),
+                    end=datetime.datetime(2017, 9, 1, 0, 0),
+                    output_type=BARS_NUMPY),
+                'threshold_buy': 7,
+                'threshold_sell': 2,
+                'intervals': None,
+                'lookback': 12
+            }
+            full_filter = Ls(arguments, TEST_LOGGER)
+            full_status = full_filter.analyse()
+            arguments['short_circuit'] = True
+            my_filter = Ls(arguments, TEST_LOGGER)
+            status = my_filter.analyse()
+            assert full_status == status, " Status: %s != %s" % (full_status, status)
+            assert symbol[1] == full_filter.get_calculation(),\
+                " Calc: %s != %s" % (symbol[1], full_filter.get_calculation())
+            # a partial score is never returned as calculation
+            assert my_filter.get_calculation() is None
+            assert my_filter.calc_bounds[0] <= symbol[1] <= my_filter.calc_bounds[1],\
+                " Bounds: %s do not contain %s" % (my_filter.calc_bounds, symbol[1])
+        db_tool.session.close()
+
+    @staticmethod
+    def test_levermann_batch():
+        """
+        Tests the batch analysis with the freezed data set of the single analysis
+        """
+        config = TraderBase.get_config()
+        db_tool = Db(config['sql'], TEST_LOGGER)
+        db_tool.connect()
+        symbols = [["LHA", 1, 0], ["MRK", -1, 0]]
+        stocks = [db_tool.session.query(Stock).filter(symbol[0] == Stock.symbol).first()
+                  for symbol in symbols]
+        arguments = {
+            'stock': None,
+            'name': Ls.NAME,
+            'bars': None,
+            'threshold_buy': 7,
+            'threshold_sell': 2,
+            'intervals': None,
+            'lookback': 12
+        }
+        my_filter = Ls(arguments, TEST_LOGGER)
+        scores, status, failed = my_filter.analyse_batch(
+            stocks, start=datetime.datetime(2016, 6, 1, 0, 0),
+            end=datetime.datetime(2017, 9, 1, 0, 0))
+        for idx, symbol in enumerate(symbols):
+            assert symbol[1] == scores[idx], " Calc: %s != %s" % (symbol[1], scores[idx])
+            assert symbol[2] == status[idx], " Status: %s != %s" % (symbol[2], status[idx])
+            assert not failed[idx]
+        db_tool.session.close()
+
+    @staticmethod
+    def test_levermann_batch_failed():
+        """
+        Tests that stocks without company data are marked as failed and hold
+        """
+        bars = get_fake_bars(np.linspace(50.0, 100.0, 400))
+        stocks = [get_fake_stock(bars, 10.0), FakeStock(bars, {})]
+        arguments = {
+            'stock': stocks[0],
+            'name': Ls.NAME,
+            'bars': bars,
+            'threshold_buy': 7,
+            'threshold_sell': 2,
+            'intervals': None,
+            'lookback': 12
+        }
+        Ls.clear_index_bars_cache()
+        my_filter = Ls(arguments, TEST_LOGGER)
+        my_filter.analyse()
+        scores, status, failed = my_filter.analyse_batch(stocks)
+        Ls.clear_index_bars_cache()
+        assert scores[0] == my_filter.get_calculation()
+        assert not failed[0]
+        assert failed[1]
+        assert status[1] == BaseFilter.HOLD
+
 
 if __name__ == '__main__':
     unittest.main()
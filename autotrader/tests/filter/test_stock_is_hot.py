@@ -18,6 +18,7 @@
 import datetime
 import unittest
 import logging
+import numpy as np
 import numpy.testing as npt
 from autotrader.base.trader_base import TraderBase
 from autotrader.filter.stock_is_hot import StockIsHot as Sih
@@ -64,6 +65,40 @@ class TestStockIsHot(unittest.TestCase):
             assert symbol[2] == status
             db_tool.session.close()
 
+    @staticmethod
+    def test_get_performance():
+        """
+        Tests the slope kernel against a least squares fit with numpy
+        """
+        interval = 7
+        prices = np.concatenate([np.linspace(10.0, 13.0, interval * 2),
+                                 np.full(interval * 2, 13.0),
+                                 np.linspace(13.0, 9.5, interval),
+                                 [12.1, 11.8, 12.6, 13.4, 12.9, 13.7, 14.2],
+                                 [14.0, 14.5]])
+        steps = prices.shape[0] // interval
+        slopes = [np.polyfit(np.arange(interval), prices[idx * interval:(idx + 1) * interval], 1)[0]
+                  for idx in range(steps)]
+        performance = Sih.get_performance(prices, interval)
+        npt.assert_allclose(performance, np.diff(slopes), atol=1e-9)
+        # two flat intervals must give an exact zero which counts as ascending
+        assert performance[2] == 0.0
+        performance = Sih.get_performance(np.array(prices.tolist() + [None], dtype=object), interval)
+        npt.assert_allclose(performance, np.diff(slopes), atol=1e-9)
+
+    @staticmethod
+    def test_get_performance_empty():
+        """
+        Tests that missing prices, too few prices and invalid intervals give an empty array
+        """
+        for array, interval in [(None, 30),
+                                (np.array([1.0, 2.0]), 30),
+                                (np.arange(60, dtype=np.float64), 0)]:
+            performance = Sih.get_performance(array, interval)
+            assert isinstance(performance, np.ndarray)
+            assert performance.dtype == np.float64
+            assert performance.shape == (0,)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -244,6 +244,8 @@ class BuildFilters:
         :return: nothing
         """
         rc = 0
+        # index bars of a previous run may be outdated
+        LevermannScore.clear_index_bars_cache()
         for stock in self.stocks:
             self.logger.info("Analyse %s:%s", stock.indices[0].symbol, stock.symbol)
             for my_filter in self.filters: